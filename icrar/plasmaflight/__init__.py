@@ -8,5 +8,6 @@ __version__ = '0.0.0'
 __author__ = 'Your Name'
 __email__ = 'your.email@mail.com'
 
+from .client.connection_pool import *
 from .client.plasmaflight_client import *
 from .server.plasmaflight_server import *
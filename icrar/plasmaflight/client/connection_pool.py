@@ -0,0 +1,123 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+import threading
+import time
+
+import pyarrow.flight as paf
+
+
+class FlightClientPool():
+    """
+    A thread-safe pool of flight clients keyed by location. Idle clients are
+    reused across calls, health checked once they have been idle for longer
+    than health_check_interval, and the idle clients of the least recently
+    used location are closed once more than max_locations are pooled.
+    """
+    def __init__(self, scheme: str = "grpc+tcp", connection_args={},
+            max_idle: int = 4, max_locations: int = 64,
+            health_check_interval: float = 30.0, health_check_timeout: float = 5.0):
+        """
+        Args:
+            scheme (str, optional): The flight uri scheme. Defaults to "grpc+tcp".
+            connection_args (dict, optional): FlightClient keyword arguments. Defaults to {}.
+            max_idle (int, optional): Idle clients kept per location. Defaults to 4.
+            max_locations (int, optional): Locations kept before LRU eviction. Defaults to 64.
+            health_check_interval (float, optional): Idle seconds before a client
+            is health checked on reuse. Defaults to 30.0.
+            health_check_timeout (float, optional): Health check timeout in seconds. Defaults to 5.0.
+        """
+        self._scheme = scheme
+        self._connection_args = connection_args
+        self.max_idle = max_idle
+        self.max_locations = max_locations
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._idle: "OrderedDict[str, List[Tuple[paf.FlightClient, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, location: str) -> Iterator[paf.FlightClient]:
+        """
+        Checks out a flight client connected to location for the duration of
+        the context. Clients that fail with a transport error are closed
+        instead of being returned to the pool.
+        """
+        client = self._acquire(location)
+        healthy = True
+        try:
+            yield client
+        except (paf.FlightUnavailableError, paf.FlightTimedOutError):
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                self._release(location, client)
+            else:
+                client.close()
+
+    def close(self):
+        """Closes all idle clients"""
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for clients in idle:
+            for client, _ in clients:
+                client.close()
+
+    def _acquire(self, location: str) -> paf.FlightClient:
+        while True:
+            with self._lock:
+                clients = self._idle.get(location)
+                if not clients:
+                    break
+                client, released = clients.pop()
+                self._idle.move_to_end(location)
+            if time.monotonic() - released < self.health_check_interval or self._is_healthy(client):
+                return client
+            client.close()
+        return paf.FlightClient(f"{self._scheme}://{location}", **self._connection_args)
+
+    def _release(self, location: str, client: paf.FlightClient):
+        evicted = []
+        with self._lock:
+            clients = self._idle.setdefault(location, [])
+            self._idle.move_to_end(location)
+            if len(clients) < self.max_idle:
+                clients.append((client, time.monotonic()))
+            else:
+                evicted.append(client)
+            while len(self._idle) > self.max_locations:
+                _, lru_clients = self._idle.popitem(last=False)
+                evicted.extend(lru_client for lru_client, _ in lru_clients)
+        for evicted_client in evicted:
+            evicted_client.close()
+
+    def _is_healthy(self, client: paf.FlightClient) -> bool:
+        try:
+            client.list_actions(options=paf.FlightCallOptions(timeout=self.health_check_timeout))
+            return True
+        except paf.FlightError:
+            return False
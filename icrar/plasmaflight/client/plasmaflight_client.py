@@ -20,13 +20,15 @@
 #    MA 02111-1307  USA
 #
 import hashlib
-from io import BytesIO
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Union
 
 import pyarrow
 import pyarrow.flight as paf
 import pyarrow.plasma as plasma
 
+from icrar.plasmaflight.client.connection_pool import FlightClientPool
+from icrar.plasmaflight.server.plasmaflight_server import FlightKey, read_chunk_batch, read_object_chunk_batch
+
 def generate_sha1_object_id(path: bytes) -> plasma.ObjectID:
     m = hashlib.sha1()
     m.update(path)
@@ -35,30 +37,37 @@ def generate_sha1_object_id(path: bytes) -> plasma.ObjectID:
 
 
 class PlasmaFlightClient():
-    def __init__(self, socket: str, scheme: str = "grpc+tcp", connection_args={}):
+    def __init__(self, socket: str, scheme: str = "grpc+tcp", connection_args={},
+            pool: Optional[FlightClientPool] = None):
         """
         Args:
             socket (str): The socket of the local plasma store
             scheme (str, optional): [description]. Defaults to "grpc+tcp".
             connection_args (dict, optional): [description]. Defaults to {}.
+            pool (FlightClientPool, optional): Flight connections to share with other
+            clients. Defaults to a new pool using scheme and connection_args.
         """
         self.plasma_client = plasma.connect(socket)
         self._scheme = scheme
         self._connection_args = connection_args
+        self._pool = pool if pool is not None else FlightClientPool(scheme, connection_args)
 
     def list_flights(self, location: str):
-        flight_client = paf.FlightClient(
-            f"{self._scheme}://{location}", **self._connection_args)
-        return flight_client.list_flights()
+        with self._pool.connection(location) as flight_client:
+            yield from flight_client.list_flights()
 
     def get_flight(self, object_id: plasma.ObjectID, location: Optional[str]) -> paf.FlightStreamReader:
+        """
+        Returns a reader of the object stream. The reader shares a pooled
+        connection with other calls.
+        """
         descriptor = paf.FlightDescriptor.for_path(object_id.binary().hex().encode('utf-8'))
         if location is not None:
-            flight_client = paf.FlightClient(f"{self._scheme}://{location}", **self._connection_args)
-            info = flight_client.get_flight_info(descriptor)
-            for endpoint in info.endpoints:
-                for location in endpoint.locations:
-                    return flight_client.do_get(endpoint.ticket)
+            with self._pool.connection(location) as flight_client:
+                info = flight_client.get_flight_info(descriptor)
+                for endpoint in info.endpoints:
+                    for location in endpoint.locations:
+                        return flight_client.do_get(endpoint.ticket)
         else:
             raise Exception()
 
@@ -71,22 +80,160 @@ class PlasmaFlightClient():
             [buf] = self.plasma_client.get_buffers([object_id])
             return memoryview(buf)
         elif owner is not None:
-            # fetch from the specified owner
-            reader = self.get_flight(object_id, owner)
-            table = reader.read_all()
-            output = BytesIO(table.column(0)[0].as_py()).getbuffer()
-            #cache output
-            self.put(output, object_id)
-            return output
+            # fetch from the specified owner and cache in the local store
+            descriptor = paf.FlightDescriptor.for_path(object_id.binary().hex().encode('utf-8'))
+            with self._pool.connection(owner) as flight_client:
+                info = flight_client.get_flight_info(descriptor)
+                return self._receive(flight_client, info, object_id)
         else:
             raise KeyError("ObjectID not found", object_id)
 
+    def _receive(self, flight_client: paf.FlightClient, info: paf.FlightInfo, object_id: plasma.ObjectID) -> memoryview:
+        """
+        Creates a plasma object of the advertised flight size and copies each
+        received batch buffer into it exactly once.
+
+        Returns:
+            memoryview: the sealed plasma buffer
+        """
+        output = memoryview(self.plasma_client.create(object_id, info.total_bytes))
+        try:
+            received = 0
+            for endpoint in info.endpoints:
+                for chunk in flight_client.do_get(endpoint.ticket):
+                    offset, data = read_chunk_batch(chunk.data)
+                    output[offset:offset + data.size] = data
+                    received += data.size
+            if received != info.total_bytes:
+                raise IOError(f"received {received} of {info.total_bytes} bytes", object_id)
+        except BaseException:
+            output.release()
+            self._discard(object_id)
+            raise
+        output.release()
+        self.plasma_client.seal(object_id)
+        [buf] = self.plasma_client.get_buffers([object_id])
+        return memoryview(buf)
+
+    def _discard(self, object_id: plasma.ObjectID):
+        """plasma cannot abort a created object, seal and delete it instead"""
+        self.plasma_client.seal(object_id)
+        self.plasma_client.delete([object_id])
+
+    def get_many(self, object_ids: Sequence[plasma.ObjectID],
+            owner: Union[str, Sequence[Optional[str]], None] = None) -> List[memoryview]:
+        """
+        Gets multiple objects, fetching those missing from the local store
+        with a single request per owner.
+
+        Args:
+            object_ids (Sequence[plasma.ObjectID]): the objects to get
+            owner (str | Sequence[Optional[str]], optional): the owner of all objects
+            or the owner of each object. Defaults to None.
+
+        Returns:
+            List[memoryview]: the plasma buffers in the order of object_ids
+        """
+        object_ids = list(object_ids)
+        buffers = self.plasma_client.get_buffers(object_ids, timeout_ms=0)
+        positions = self._positions(object_ids)
+        for location, missing in self._group_missing(object_ids, buffers, owner).items():
+            with self._pool.connection(location) as flight_client:
+                self._receive_many(flight_client, missing)
+            fetched = self.plasma_client.get_buffers(missing, timeout_ms=0)
+            for object_id, buffer in zip(missing, fetched):
+                for i in positions[object_id]:
+                    buffers[i] = buffer
+        for object_id, buffer in zip(object_ids, buffers):
+            if buffer is None:
+                raise KeyError("ObjectID not found", object_id)
+        return [memoryview(buffer) for buffer in buffers]
+
+    def _receive_many(self, flight_client: paf.FlightClient, object_ids: List[plasma.ObjectID]):
+        """
+        Fetches multiple objects with one multi object ticket, creating and
+        sealing each object in the local store as its chunks arrive.
+        """
+        key = FlightKey(paf.DescriptorType.PATH.value, None,
+            tuple(object_id.binary().hex().encode('ascii') for object_id in object_ids))
+        output = None
+        object_id = None
+        try:
+            for chunk in flight_client.do_get(paf.Ticket(repr(key))):
+                chunk_id, size, offset, data = read_object_chunk_batch(chunk.data)
+                if chunk_id != object_id:
+                    object_id = chunk_id
+                    output = memoryview(self.plasma_client.create(object_id, size))
+                    received = 0
+                output[offset:offset + data.size] = data
+                received += data.size
+                if received == size:
+                    output.release()
+                    output = None
+                    self.plasma_client.seal(object_id)
+        except BaseException:
+            if output is not None:
+                output.release()
+                self._discard(object_id)
+            raise
+
+    def exists_many(self, object_ids: Sequence[plasma.ObjectID],
+            owner: Union[str, Sequence[Optional[str]], None] = None) -> List[bool]:
+        """
+        Checks whether multiple objects exist, querying those missing from
+        the local store with a single request per owner.
+
+        Args:
+            object_ids (Sequence[plasma.ObjectID]): the objects to check
+            owner (str | Sequence[Optional[str]], optional): the owner of all objects
+            or the owner of each object. Defaults to None.
+
+        Returns:
+            List[bool]: whether each object exists in the order of object_ids
+        """
+        object_ids = list(object_ids)
+        buffers = self.plasma_client.get_buffers(object_ids, timeout_ms=0)
+        result = [buffer is not None for buffer in buffers]
+        positions = self._positions(object_ids)
+        for location, missing in self._group_missing(object_ids, buffers, owner).items():
+            try:
+                with self._pool.connection(location) as client:
+                    [contains] = client.do_action(paf.Action(
+                        "contains", b''.join(object_id.binary() for object_id in missing)))
+                found = contains.body.to_pybytes()
+            except paf.FlightError:
+                continue
+            for object_id, exists in zip(missing, found):
+                for i in positions[object_id]:
+                    result[i] = bool(exists)
+        return result
+
+    @staticmethod
+    def _positions(object_ids: List[plasma.ObjectID]) -> Dict[plasma.ObjectID, List[int]]:
+        positions: Dict[plasma.ObjectID, List[int]] = {}
+        for i, object_id in enumerate(object_ids):
+            positions.setdefault(object_id, []).append(i)
+        return positions
+
+    @staticmethod
+    def _group_missing(object_ids: List[plasma.ObjectID], buffers: list,
+            owner: Union[str, Sequence[Optional[str]], None]) -> Dict[str, List[plasma.ObjectID]]:
+        """Groups the object ids without a local buffer by owner"""
+        owners = [owner] * len(object_ids) if owner is None or isinstance(owner, str) else owner
+        groups: Dict[str, List[plasma.ObjectID]] = {}
+        grouped = set()
+        for object_id, buffer, location in zip(object_ids, buffers, owners):
+            if buffer is None and location is not None and object_id not in grouped:
+                grouped.add(object_id)
+                groups.setdefault(location, []).append(object_id)
+        return groups
+
     def exists(self, object_id: plasma.ObjectID, owner: Optional[str] = None) -> bool:
         if self.plasma_client.contains(object_id): return True
         if owner is not None:
-            client = paf.FlightClient(f"{self._scheme}://{owner}", **self._connection_args)
             try:
-                info = client.get_flight_info(paf.FlightDescriptor.for_path(object_id.binary().hex().encode('utf-8')))
+                with self._pool.connection(owner) as client:
+                    client.get_flight_info(paf.FlightDescriptor.for_path(object_id.binary().hex().encode('utf-8')))
                 return True
             except:
                 return False
@@ -26,6 +26,7 @@ from dataclasses import dataclass, astuple
 
 import subprocess
 import argparse
+import struct
 import threading
 
 import pyarrow
@@ -51,6 +52,73 @@ class FlightKey:
         return getattr(self, item)
 
 
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+"""Default number of plasma bytes sent in each record batch of a flight"""
+
+RAW_SCHEMA = pyarrow.schema([('offset', pyarrow.uint64()), ('data', pyarrow.binary())])
+"""Schema of streamed raw plasma objects, one buffer chunk per record batch"""
+
+OBJECTS_SCHEMA = pyarrow.schema([
+    ('object_id', pyarrow.binary(20)),
+    ('size', pyarrow.uint64()),
+    ('offset', pyarrow.uint64()),
+    ('data', pyarrow.binary())])
+"""Schema of multiple streamed raw plasma objects, one buffer chunk per record batch"""
+
+
+def _chunk_array(chunk: pyarrow.Buffer) -> pyarrow.Array:
+    offsets = pyarrow.py_buffer(struct.pack('<ii', 0, chunk.size))
+    return pyarrow.Array.from_buffers(pyarrow.binary(), 1, [None, offsets, chunk])
+
+
+def _chunk_buffer(data: pyarrow.Array) -> pyarrow.Buffer:
+    start, end = struct.unpack_from('<ii', data.buffers()[1], data.offset * 4)
+    return data.buffers()[2].slice(start, end - start)
+
+
+def make_chunk_batch(offset: int, chunk: pyarrow.Buffer) -> pyarrow.RecordBatch:
+    """
+    Wraps a slice of a plasma buffer in a single row record batch without
+    copying the underlying memory.
+    """
+    return pyarrow.record_batch(
+        [pyarrow.array([offset], pyarrow.uint64()), _chunk_array(chunk)], schema=RAW_SCHEMA)
+
+
+def read_chunk_batch(batch: pyarrow.RecordBatch) -> Tuple[int, pyarrow.Buffer]:
+    """
+    Returns the object offset and data buffer of a record batch created
+    by make_chunk_batch without copying the underlying memory. Single row
+    fixed size binary batches of earlier servers are read as offset 0.
+    """
+    if batch.num_columns == 1 and isinstance(batch.schema.types[0], pyarrow.FixedSizeBinaryType):
+        data = batch.column(0)
+        width = data.type.byte_width
+        return 0, data.buffers()[1].slice(data.offset * width, width)
+    return batch.column(0)[0].as_py(), _chunk_buffer(batch.column(1))
+
+
+def make_object_chunk_batch(object_id: plasma.ObjectID, size: int, offset: int, chunk: pyarrow.Buffer) -> pyarrow.RecordBatch:
+    """
+    Wraps a slice of the plasma buffer of object_id in a single row record
+    batch without copying the underlying memory.
+    """
+    return pyarrow.record_batch([
+        pyarrow.array([object_id.binary()], pyarrow.binary(20)),
+        pyarrow.array([size], pyarrow.uint64()),
+        pyarrow.array([offset], pyarrow.uint64()),
+        _chunk_array(chunk)], schema=OBJECTS_SCHEMA)
+
+
+def read_object_chunk_batch(batch: pyarrow.RecordBatch) -> Tuple[plasma.ObjectID, int, int, pyarrow.Buffer]:
+    """
+    Returns the object id, object size, offset and data buffer of a record
+    batch created by make_object_chunk_batch without copying the data.
+    """
+    return (plasma.ObjectID(batch.column(0)[0].as_py()), batch.column(1)[0].as_py(),
+            batch.column(2)[0].as_py(), _chunk_buffer(batch.column(3)))
+
+
 class PlasmaUtils:
     @classmethod
     def put_dataframe(cls, client: plasma.PlasmaClient, data, object_id: plasma.ObjectID):
@@ -147,11 +215,15 @@ class PlasmaFlightServer(flight.FlightServerBase):
             memory=10000000,
             plasma_socket:str="/tmp/plasma",
             tls_certificates:list=None, verify_client:bool=False,
-            root_certificates:bytes=None, auth_handler:flight.ServerAuthHandler=None):
+            root_certificates:bytes=None, auth_handler:flight.ServerAuthHandler=None,
+            chunk_size:int=DEFAULT_CHUNK_SIZE):
         super(PlasmaFlightServer, self).__init__(
             location, auth_handler, tls_certificates, verify_client,
             root_certificates)
+        if not 0 < chunk_size < 2**31:
+            raise ValueError(f"chunk_size must be between 1 and {2**31 - 1} bytes")
         self.host = host
+        self.chunk_size = chunk_size
         self._socket = plasma_socket
         if run_plasma:
             self.plasma_server = subprocess.Popen(["plasma_store", "-m", str(memory), "-s", plasma_socket])
@@ -208,9 +280,8 @@ class PlasmaFlightServer(flight.FlightServerBase):
                 self.host, self.port)
         endpoints = [flight.FlightEndpoint(repr(key), [location]), ]
         data_size = self.plasma_client.list()[data]['data_size']
-        return flight.FlightInfo(
-            pyarrow.schema([('data', pyarrow.binary(length=data_size))]),
-            descriptor, endpoints, 1, data_size)
+        num_chunks = -(-data_size // self.chunk_size)
+        return flight.FlightInfo(RAW_SCHEMA, descriptor, endpoints, num_chunks, data_size)
 
     def _make_flight_info(self, key: FlightKey, descriptor: flight.FlightDescriptor, data: plasma.ObjectID) -> flight.FlightInfo:
         if isinstance(data, pyarrow.Table):
@@ -259,23 +330,48 @@ class PlasmaFlightServer(flight.FlightServerBase):
         key = eval(ticket.ticket.decode())
 
        # plasma memory
-        object_id = plasma.ObjectID(bytes.fromhex(key.path[0].decode('ascii')))
+        object_ids = [plasma.ObjectID(bytes.fromhex(path.decode('ascii'))) for path in key.path]
+        if len(object_ids) > 1:
+            return flight.GeneratorStream(OBJECTS_SCHEMA, self._generate_object_chunks(object_ids))
+
+        # stream zero-copy slices of the plasma buffer
+        buffer = PlasmaUtils.get_buffer(self.plasma_client, object_ids[0])
+        return flight.GeneratorStream(RAW_SCHEMA, self._generate_chunks(buffer))
 
-        # read as bytes from plasma and wrap in pyarrow table
-        buffer = PlasmaUtils.get_memoryview(self.plasma_client, object_id)
-        schema = pyarrow.schema([('data', pyarrow.binary(buffer.nbytes))])
-        wrapper = pyarrow.Table.from_batches([pyarrow.record_batch([[buffer]], schema)], schema)
-        return flight.RecordBatchStream(wrapper)
+    def _generate_chunks(self, buffer: pyarrow.Buffer):
+        for offset in range(0, buffer.size, self.chunk_size):
+            length = min(self.chunk_size, buffer.size - offset)
+            yield make_chunk_batch(offset, buffer.slice(offset, length))
+
+    def _generate_object_chunks(self, object_ids: List[plasma.ObjectID]):
+        """
+        Streams the objects available in the store one after another,
+        objects that are not found are skipped.
+        """
+        buffers = self.plasma_client.get_buffers(object_ids, timeout_ms=0)
+        for object_id, buffer in zip(object_ids, buffers):
+            if buffer is None:
+                continue
+            # empty objects are sent as a single empty chunk
+            for offset in range(0, max(buffer.size, 1), self.chunk_size):
+                length = min(self.chunk_size, buffer.size - offset)
+                yield make_object_chunk_batch(object_id, buffer.size, offset, buffer.slice(offset, length))
 
     def list_actions(self, context):
         return [
             ("clear", "Clear the stored flights."),
+            ("contains", "Check which of the concatenated 20 byte object ids are stored."),
             ("shutdown", "Shut down this server."),
         ]
 
     def do_action(self, context, action):
         if action.type == "clear":
             raise NotImplementedError(f"{action.type} is not implemented.")
+        elif action.type == "contains":
+            body = action.body.to_pybytes()
+            yield flight.Result(pyarrow.py_buffer(bytes(
+                self.plasma_client.contains(plasma.ObjectID(body[i:i + 20]))
+                for i in range(0, len(body), 20))))
         elif action.type == "healthcheck":
             pass
         elif action.type == "shutdown":
@@ -315,6 +411,8 @@ def main():
                         help="client tls root certificate file")
     parser.add_argument("--verify_client", type=bool, default=False,
                         help="enable mutual TLS and verify the client if True")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="maximum bytes of a plasma object sent per record batch")
 
     args = parser.parse_args()
     tls_certificates = []
@@ -339,7 +437,8 @@ def main():
                         memory=args.memory,
                         tls_certificates=tls_certificates,
                         root_certificates=client_cert_chain,
-                        verify_client=args.verify_client)
+                        verify_client=args.verify_client,
+                        chunk_size=args.chunk_size)
     print("Serving on", location)
     server.serve()
 
@@ -30,6 +30,8 @@ import pyarrow.plasma as plasma
 
 from icrar.plasmaflight import PlasmaFlightServer
 from icrar.plasmaflight import PlasmaFlightClient, generate_sha1_object_id
+from icrar.plasmaflight import make_chunk_batch, read_chunk_batch
+from icrar.plasmaflight import FlightClientPool
 
 class TestPlasmaFlightClientServer(unittest.TestCase):
     """Tests the plasmaflight client server"""
@@ -134,3 +136,32 @@ class TestPlasmaFlightClientServer(unittest.TestCase):
         output = np.load(BytesIO(self._client.get(object_id)))
         assert np.array_equal(output, tensor)
 
+    def test_chunk_batch(self):
+        data = pyarrow.py_buffer(b"Hello World!")
+        offset, chunk = read_chunk_batch(make_chunk_batch(6, data.slice(6, 5)))
+        assert offset == 6
+        assert chunk.address == data.address + 6
+        assert chunk.to_pybytes() == b"World"
+
+    def test_chunk_batch_fixed_size(self):
+        schema = pyarrow.schema([('data', pyarrow.binary(5))])
+        batch = pyarrow.record_batch([[b"Hello"]], schema)
+        offset, chunk = read_chunk_batch(batch)
+        assert offset == 0
+        assert chunk.to_pybytes() == b"Hello"
+
+    def test_connection_pool(self):
+        pool = FlightClientPool("grpc+tcp", max_idle=1, max_locations=1, health_check_interval=0)
+        with pool.connection("localhost:5005") as client0:
+            assert len(client0.list_actions()) > 0
+        # reused after a health check
+        with pool.connection("localhost:5005") as client1:
+            assert client1 is client0
+            with pool.connection("localhost:5005") as client2:
+                assert client2 is not client0
+        # least recently used location is evicted
+        with pool.connection("localhost:5006"):
+            pass
+        with pool.connection("localhost:5005") as client3:
+            assert client3 is not client0
+        pool.close()
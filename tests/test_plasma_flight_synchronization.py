@@ -97,3 +97,42 @@ class TestPlasmaFlightSynchronization(unittest.TestCase):
         output = np.load(BytesIO(self._client1.get(object_id, "localhost:5005")))
         assert np.array_equal(output, tensor)
 
+
+    def test_chunked(self):
+        self._server0._shutdown()
+        self._server0 = PlasmaFlightServer(
+            location="grpc+tcp://localhost:5005",
+            plasma_socket="/tmp/plasma0",
+            tls_certificates=[],
+            verify_client=False,
+            chunk_size=7)
+        input = bytes(range(256)) * 4
+        object_id = generate_sha1_object_id(input)
+        self._client0.put(memoryview(input), object_id)
+        output = self._client1.get(object_id, "localhost:5005")
+        assert output.tobytes() == input
+
+    def test_remote_sealed(self):
+        input = "你好".encode('utf-8')
+        object_id = generate_sha1_object_id(input)
+        self._client0.put(memoryview(input), object_id)
+        output = self._client1.get(object_id, "localhost:5005")
+        assert output.readonly
+        assert self._client1.plasma_client.list()[object_id]['state'] == 'sealed'
+        assert output.tobytes() == input
+
+    def test_get_many(self):
+        inputs = [f"object {i}".encode('utf-8') for i in range(8)] + [b'']
+        object_ids = [generate_sha1_object_id(input) for input in inputs]
+        for input, object_id in zip(inputs[1:], object_ids[1:]):
+            self._client0.put(memoryview(input), object_id)
+        self._client1.put(memoryview(inputs[0]), object_ids[0])
+        missing = generate_sha1_object_id(b'missing')
+
+        assert self._client1.exists_many(object_ids + [missing]) == [True] + [False] * 9
+        assert self._client1.exists_many(object_ids + [missing], "localhost:5005") == [True] * 9 + [False]
+        outputs = self._client1.get_many(object_ids, "localhost:5005")
+        assert [output.tobytes() for output in outputs] == inputs
+        assert self._client1.exists_many(object_ids) == [True] * 9
+        with self.assertRaises(KeyError):
+            self._client1.get_many([object_ids[0], missing], "localhost:5005")